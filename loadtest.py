@@ -0,0 +1,311 @@
+"""
+Load generator for the JRA bot API.
+
+Drives the FastAPI app in-process (default) or a running server (--url)
+with a weighted mix of endpoints and prints per-endpoint throughput,
+latency percentiles and error rates as JSON.
+
+    python loadtest.py --duration 30 --concurrency 20 --mix scan_image=1,balance=5,callback=5
+    python loadtest.py --url http://localhost:8000 --line-stub-port 9099 --output report.json
+
+Against a running server, start it with LINE_API_ENDPOINT=http://127.0.0.1:<stub port>
+and pass a real LIFF ID token with --id-token; without one the authenticated
+endpoints (bets, balance) only measure the 401 path.
+"""
+import argparse
+import asyncio
+import base64
+import contextlib
+import datetime
+import hashlib
+import hmac
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+import httpx
+
+ENDPOINTS = ["scan_image", "parse_qr", "bets", "balance", "callback"]
+DEFAULT_MIX = "scan_image=1,parse_qr=2,bets=2,balance=5,callback=5"
+
+# Same layout as test_jra_parser.py: Tokyo, 2023, 5th kai, 4th day, 11R, 3連単
+SAMPLE_QR = "105000230504119" + "0" * 175
+
+
+class StubLineBotApi:
+    """In-process replacement for LineBotApi: records calls instead of hitting LINE"""
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _record(self, *args, **kwargs):
+        with self._lock:
+            self.calls += 1
+
+    reply_message = _record
+    push_message = _record
+
+
+class StubLIFFAuthenticator:
+    """In-process replacement for LIFFAuthenticator: the bearer token is the user ID"""
+    def verify(self, id_token):
+        return id_token or None
+
+
+class _StubLineHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        body = b"{}"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_line_stub(port: int) -> ThreadingHTTPServer:
+    """Local HTTP server accepting any LINE Messaging API call"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), _StubLineHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"LINE API stub listening on http://127.0.0.1:{port}", file=sys.stderr)
+    return server
+
+
+def make_ticket_image() -> bytes:
+    """
+    PNG of a synthetic ticket: the 190-digit payload split into two QR codes
+    side by side, like a real JRA ticket. Falls back to a noise image
+    (still exercises the full decode path) if zxing-cpp cannot write QR codes.
+    """
+    from PIL import Image
+    import numpy as np
+
+    canvas = Image.new("L", (900, 500), 255)
+    try:
+        import zxingcpp
+        for i, half in enumerate([SAMPLE_QR[:95], SAMPLE_QR[95:]]):
+            qr = np.array(zxingcpp.write_barcode(zxingcpp.BarcodeFormat.QRCode, half, 300, 300))
+            canvas.paste(Image.fromarray(qr.astype("uint8")), (100 + i * 400, 100))
+    except Exception as e:
+        print(f"WARNING: could not render QR codes ({e}); using noise image", file=sys.stderr)
+        noise = np.random.default_rng(0).integers(0, 256, size=(500, 900), dtype="uint8")
+        canvas = Image.fromarray(noise)
+
+    buf = io.BytesIO()
+    canvas.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def make_callback_body(user_id: str) -> bytes:
+    event = {
+        "type": "message",
+        "mode": "active",
+        "timestamp": int(time.time() * 1000),
+        "webhookEventId": uuid.uuid4().hex,
+        "deliveryContext": {"isRedelivery": False},
+        "replyToken": uuid.uuid4().hex,
+        "source": {"type": "user", "userId": user_id},
+        "message": {"id": str(random.randint(10**14, 10**15)), "type": "text", "text": "収支"},
+    }
+    return json.dumps({"destination": "Uloadtest", "events": [event]}, ensure_ascii=False).encode("utf-8")
+
+
+def sign(channel_secret: str, body: bytes) -> str:
+    digest = hmac.new(channel_secret.encode("utf-8"), body, hashlib.sha256).digest()
+    return base64.b64encode(digest).decode("ascii")
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint in mix: {name} (choose from {', '.join(ENDPOINTS)})")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, channel_secret: str, mix: Dict[str, float],
+                 concurrency: int, duration: float, image: bytes, id_token: str = None):
+        self.client = client
+        self.id_token = id_token
+        self.channel_secret = channel_secret
+        self.names = list(mix.keys())
+        self.weights = list(mix.values())
+        self.concurrency = concurrency
+        self.duration = duration
+        self.image = image
+        self.latencies: Dict[str, List[float]] = {n: [] for n in self.names}
+        self.statuses: Dict[str, Dict[str, int]] = {n: {} for n in self.names}
+
+    async def request(self, name: str, worker: int):
+        user_id = f"loadtest-user-{worker}"
+        # In-process the stub authenticator maps each worker's token to its own user
+        token = self.id_token or user_id
+        auth = {"Authorization": f"Bearer {token}"}
+        today = datetime.date.today()
+
+        if name == "scan_image":
+            files = {"file": (f"loadtest_w{worker}.png", self.image, "image/png")}
+            return await self.client.post("/api/scan_image", files=files)
+        if name == "parse_qr":
+            return await self.client.post("/api/parse_qr", json={"raw_qr": SAMPLE_QR})
+        if name == "bets":
+            ticket = {"place_code": "東京", "race_num": random.randint(1, 12),
+                      "bet_type": "単勝", "amount": 100, "buy_details": str(random.randint(1, 18))}
+            return await self.client.post("/api/bets", json={"tickets": [ticket]}, headers=auth)
+        if name == "balance":
+            return await self.client.get(f"/api/balance/{today.year}/{today.month}", headers=auth)
+        if name == "callback":
+            body = make_callback_body(user_id)
+            headers = {"Content-Type": "application/json", "X-Line-Signature": sign(self.channel_secret, body)}
+            return await self.client.post("/callback", content=body, headers=headers)
+        raise ValueError(name)
+
+    async def worker(self, worker: int, deadline: float):
+        rng = random.Random(worker)
+        while time.monotonic() < deadline:
+            name = rng.choices(self.names, self.weights)[0]
+            start = time.perf_counter()
+            try:
+                res = await self.request(name, worker)
+                status = str(res.status_code)
+            except Exception as e:
+                status = type(e).__name__
+            self.latencies[name].append(time.perf_counter() - start)
+            self.statuses[name][status] = self.statuses[name].get(status, 0) + 1
+
+    async def run(self) -> dict:
+        started = time.monotonic()
+        deadline = started + self.duration
+        await asyncio.gather(*(self.worker(i, deadline) for i in range(self.concurrency)))
+        elapsed = time.monotonic() - started
+        return self.report(elapsed)
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        total_requests = 0
+        total_errors = 0
+        for name in self.names:
+            lat = sorted(self.latencies[name])
+            count = len(lat)
+            errors = sum(n for s, n in self.statuses[name].items() if not (s.isdigit() and int(s) < 400))
+            total_requests += count
+            total_errors += errors
+            endpoints[name] = {
+                "requests": count,
+                "throughput_rps": round(count / elapsed, 2),
+                "errors": errors,
+                "error_rate": round(errors / count, 4) if count else 0.0,
+                "status_counts": self.statuses[name],
+                "latency_ms": {
+                    "p50": round(percentile(lat, 0.50) * 1000, 1),
+                    "p95": round(percentile(lat, 0.95) * 1000, 1),
+                    "p99": round(percentile(lat, 0.99) * 1000, 1),
+                    "max": round(lat[-1] * 1000, 1) if lat else 0.0,
+                },
+            }
+        return {
+            "duration_s": round(elapsed, 2),
+            "concurrency": self.concurrency,
+            "total": {
+                "requests": total_requests,
+                "throughput_rps": round(total_requests / elapsed, 2),
+                "errors": total_errors,
+                "error_rate": round(total_errors / total_requests, 4) if total_requests else 0.0,
+            },
+            "endpoints": endpoints,
+        }
+
+
+def in_process_client():
+    """Imports main against a throwaway database with the LINE API stubbed out"""
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    tmpdir = tempfile.mkdtemp(prefix="jra_loadtest_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir}/loadtest.db"
+
+    import main
+    main.line_bot_api = StubLineBotApi()
+    main.liff_auth = StubLIFFAuthenticator()
+
+    transport = httpx.ASGITransport(app=main.app)
+    client = httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60)
+    return client, main.CHANNEL_SECRET
+
+
+async def run(args) -> dict:
+    if args.url:
+        if args.line_stub_port:
+            start_line_stub(args.line_stub_port)
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+        channel_secret = args.channel_secret
+    else:
+        client, channel_secret = in_process_client()
+
+    image = make_ticket_image()
+    async with client:
+        test = LoadTest(client, channel_secret, parse_mix(args.mix),
+                        args.concurrency, args.duration, image, args.id_token)
+        report = await test.run()
+        report["target"] = args.url or "in-process"
+        report["mix"] = args.mix
+
+        # Server-side queueing, if admission control is enabled
+        try:
+            res = await client.get("/api/admission/stats")
+            if res.status_code == 200:
+                report["admission"] = res.json()
+        except httpx.HTTPError:
+            pass
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the JRA bot API")
+    parser.add_argument("--url", default=None, help="Base URL of a running server (default: drive the app in-process)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent simulated clients")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Endpoint weights, e.g. {DEFAULT_MIX}")
+    parser.add_argument("--channel-secret", default=os.getenv("LINE_CHANNEL_SECRET", "YOUR_CHANNEL_SECRET"),
+                        help="Secret used to sign /callback payloads (--url mode)")
+    parser.add_argument("--line-stub-port", type=int, default=None,
+                        help="Start a LINE API stub on this port (--url mode)")
+    parser.add_argument("--id-token", default=os.getenv("LOADTEST_ID_TOKEN"),
+                        help="LIFF ID token sent as the bearer token (--url mode)")
+    parser.add_argument("--output", default=None, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    # The app logs with print(); keep stdout for the report so it can be piped to jq etc.
+    with contextlib.redirect_stdout(sys.stderr):
+        report = asyncio.run(run(args))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"Report written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
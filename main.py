@@ -1,9 +1,14 @@
 import os
+import re
 import sys
+import json
+import uuid
+import asyncio
 import aiofiles
-from fastapi import FastAPI, Request, HTTPException, UploadFile, File
-from fastapi.responses import RedirectResponse
+from fastapi import FastAPI, Request, HTTPException, UploadFile, File, Header, Query, Depends
+from fastapi.responses import RedirectResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 from linebot import LineBotApi, WebhookHandler
 from linebot.exceptions import InvalidSignatureError
 from linebot.models import (
@@ -13,12 +18,25 @@ from modules.qr_reader import QRReader, JRAParser
 from modules.jra_scraper import JRAScraper
 from modules.calculator import Calculator
 from modules.reporter import Reporter
+from modules.exporter import Exporter, EXPORT_FORMATS
+from modules.line_auth import LIFFAuthenticator, StreamTicketStore
+from modules.admission import AdmissionController, AdmissionMiddleware
+from modules.events import BalanceBroadcaster
+from modules.series import cumulative_balance_series, encode_typed_array
 import datetime
 from pydantic import BaseModel
 from typing import List, Optional
 
 app = FastAPI()
 
+# Per-route concurrency limits and bounded queues (scan storms must not starve the webhook)
+# SSE streams stay open indefinitely, so they must not hold admission slots
+admission = AdmissionController(exempt_patterns=[
+    r"/api/admission/stats",
+    r"/api/balance/\d+/\d+/stream",
+])
+app.add_middleware(AdmissionMiddleware, controller=admission)
+
 # Mount static files for LIFF
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -31,7 +49,10 @@ async def root():
 CHANNEL_SECRET = os.getenv('LINE_CHANNEL_SECRET', 'YOUR_CHANNEL_SECRET')
 CHANNEL_ACCESS_TOKEN = os.getenv('LINE_CHANNEL_ACCESS_TOKEN', 'YOUR_CHANNEL_ACCESS_TOKEN')
 
-line_bot_api = LineBotApi(CHANNEL_ACCESS_TOKEN)
+# LINE_API_ENDPOINT lets load tests point the bot at a local stub instead of api.line.me
+LINE_API_ENDPOINT = os.getenv('LINE_API_ENDPOINT', 'https://api.line.me')
+
+line_bot_api = LineBotApi(CHANNEL_ACCESS_TOKEN, endpoint=LINE_API_ENDPOINT)
 handler = WebhookHandler(CHANNEL_SECRET)
 
 # Initialize modules
@@ -40,6 +61,27 @@ qr_reader = QRReader()
 scraper = JRAScraper()
 calculator = Calculator() # Uses env var or default sqlite
 reporter = Reporter(calculator)
+exporter = Exporter(calculator)
+liff_auth = LIFFAuthenticator()
+stream_tickets = StreamTicketStore()
+broadcaster = BalanceBroadcaster()
+
+def _on_bet_change(user_id, day, bet_delta, return_delta):
+    # Runs in the threadpool right after add_bet / update_result commits
+    if not broadcaster.has_subscribers(user_id, day.year, day.month):
+        return
+    event = {
+        "type": "delta",
+        "bet_delta": bet_delta,
+        "return_delta": return_delta,
+        # New totals for the day, so clients can apply events idempotently
+        **calculator.get_daily_totals(day, user_id=user_id)
+    }
+    broadcaster.publish(user_id, day.year, day.month, event)
+
+calculator.add_listener(_on_bet_change)
+
+SSE_KEEPALIVE_SECONDS = 15
 
 # Ensure temp directory for images exists
 os.makedirs("data/temp", exist_ok=True)
@@ -58,6 +100,31 @@ class BetRequest(BaseModel):
 class ParseRequest(BaseModel):
     raw_qr: str
 
+def _verify_line_user(token: str) -> str:
+    user_id = liff_auth.verify(token)
+    if not user_id:
+        raise HTTPException(
+            status_code=401,
+            detail="認証に失敗しました",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    return user_id
+
+def get_line_user_id(authorization: Optional[str] = Header(None)) -> str:
+    """Resolves the LINE user from the LIFF ID token in 'Authorization: Bearer <token>'"""
+    # Plain def: token verification may call the LINE API, so FastAPI runs it in the threadpool
+    token = ""
+    if authorization and authorization.startswith("Bearer "):
+        token = authorization[len("Bearer "):].strip()
+    return _verify_line_user(token)
+
+def get_line_user_id_from_ticket(ticket: str = Query("")) -> str:
+    """For EventSource, which cannot set request headers: redeems a ticket from /api/balance/stream_ticket"""
+    user_id = stream_tickets.redeem(ticket)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="認証に失敗しました")
+    return user_id
+
 @app.post("/api/parse_qr")
 async def parse_qr(request: ParseRequest):
     try:
@@ -80,19 +147,21 @@ async def parse_qr(request: ParseRequest):
         raise HTTPException(status_code=400, detail="解析に失敗しました")
 
 @app.post("/api/bets")
-async def register_bets(request: BetRequest):
+async def register_bets(request: BetRequest, user_id: str = Depends(get_line_user_id)):
     try:
         current_date = datetime.date.today().strftime("%Y-%m-%d")
         registered_count = 0
         
         for ticket in request.tickets:
-            calculator.add_bet(
+            await run_in_threadpool(
+                calculator.add_bet,
                 current_date,
                 ticket.place_code,
                 ticket.race_num,
                 ticket.bet_type,
                 ticket.buy_details,
-                ticket.amount
+                ticket.amount,
+                user_id=user_id
             )
             registered_count += 1
             
@@ -102,15 +171,21 @@ async def register_bets(request: BetRequest):
 
 @app.post("/api/scan_image")
 async def scan_image(file: UploadFile = File(...)):
+    # Unique temp name per request: concurrent uploads often share a name like image.jpg,
+    # and the client-supplied filename must not be used as a path
+    suffix = os.path.splitext(file.filename or "")[1].lower()
+    if not re.fullmatch(r"\.[a-z0-9]{1,5}", suffix):
+        suffix = ""
+    temp_filename = f"data/temp/{uuid.uuid4().hex}{suffix}"
+
     try:
         # Save uploaded file to temp
-        temp_filename = f"data/temp/{file.filename}"
         async with aiofiles.open(temp_filename, 'wb') as out_file:
             content = await file.read()
             await out_file.write(content)
             
-        # Decode
-        tickets = qr_reader.decode_ticket(temp_filename)
+        # Decode (CPU-heavy: keep it off the event loop)
+        tickets = await run_in_threadpool(qr_reader.decode_ticket, temp_filename)
         
         if not tickets:
              return {"status": "failed", "message": "QRコードが見つかりませんでした"}
@@ -133,15 +208,106 @@ async def scan_image(file: UploadFile = File(...)):
     except Exception as e:
         print(f"Scan error: {e}")
         raise HTTPException(status_code=500, detail="画像の解析に失敗しました")
+    finally:
+        try:
+            os.remove(temp_filename)
+        except OSError:
+            pass
+
+@app.get("/api/balance/series")
+async def get_balance_series(start: datetime.date, end: datetime.date, points: int = 300,
+                             user_id: str = Depends(get_line_user_id)):
+    """
+    Cumulative balance over [start, end], downsampled to at most `points` points.
+    t: days since 1970-01-01 (int32), v: cumulative balance in Yen (float64),
+    both base64-encoded little-endian arrays.
+    """
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if not 10 <= points <= 5000:
+        raise HTTPException(status_code=400, detail="points must be between 10 and 5000")
+
+    try:
+        days, balances, total = await run_in_threadpool(
+            cumulative_balance_series, calculator, start, end, points, user_id=user_id
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "days": total,
+        "points": len(days),
+        "t": encode_typed_array(days, "int32"),
+        "v": encode_typed_array(balances, "float64")
+    }
 
 @app.get("/api/balance/{year}/{month}")
-async def get_monthly_balance(year: int, month: int):
+async def get_monthly_balance(year: int, month: int, user_id: str = Depends(get_line_user_id)):
     try:
-        summary = calculator.get_monthly_summary(year, month)
+        summary = await run_in_threadpool(calculator.get_monthly_summary, year, month, user_id=user_id)
         return summary
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/balance/stream_ticket")
+async def issue_stream_ticket(user_id: str = Depends(get_line_user_id)):
+    """Single-use ticket for opening one balance stream (keeps the ID token out of URLs and logs)"""
+    return {"ticket": stream_tickets.issue(user_id), "expires_in": stream_tickets.ttl}
+
+@app.get("/api/balance/{year}/{month}/stream")
+async def stream_monthly_balance(request: Request, year: int, month: int,
+                                 user_id: str = Depends(get_line_user_id_from_ticket)):
+    """Server-Sent Events: a snapshot of the month, then per-day updates as bets change"""
+    # Reject before the 200 goes out; a stream that fails later just makes EventSource reconnect
+    if not (1 <= year <= 9999 and 1 <= month <= 12):
+        raise HTTPException(status_code=400, detail="invalid year or month")
+
+    async def events():
+        # Subscribe inside the generator so the finally below always pairs with it
+        queue = broadcaster.subscribe(user_id, year, month)
+        try:
+            # Subscribed before taking the snapshot, so no change is missed in between.
+            # Delta events carry the day's new totals, so overlap is harmless.
+            summary = await run_in_threadpool(calculator.get_monthly_summary, year, month, user_id=user_id)
+            yield f"event: snapshot\ndata: {json.dumps(summary)}\n\n"
+
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            broadcaster.unsubscribe(user_id, year, month, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/export/bets")
+async def export_bets(start: datetime.date, end: datetime.date, format: str = "csv", user_id: str = Depends(get_line_user_id)):
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+
+    filename = f"bets_{start:%Y%m%d}_{end:%Y%m%d}.{format}"
+    # Sync generator: Starlette iterates it in the threadpool, chunk by chunk
+    return StreamingResponse(
+        exporter.iter_export(start, end, format, user_id=user_id),
+        media_type=exporter.media_type(format),
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/api/admission/stats")
+async def admission_stats():
+    return admission.stats()
+
 @app.post("/callback")
 async def callback(request: Request):
     # get X-Line-Signature header value
@@ -153,7 +319,8 @@ async def callback(request: Request):
 
     # handle webhook body
     try:
-        handler.handle(body_text, signature)
+        # Handlers call the LINE API synchronously
+        await run_in_threadpool(handler.handle, body_text, signature)
     except InvalidSignatureError:
         raise HTTPException(status_code=400, detail="Invalid signature")
 
@@ -162,11 +329,14 @@ async def callback(request: Request):
 @handler.add(MessageEvent, message=TextMessage)
 def handle_text_message(event):
     text = event.message.text.strip()
+    user_id = getattr(event.source, "user_id", None)
     
     # Fallback to text commands if LIFF is not used
     if text == "収支":
+        if not user_id:
+            return
         today = datetime.date.today()
-        summary = calculator.get_monthly_summary(today.year, today.month)
+        summary = calculator.get_monthly_summary(today.year, today.month, user_id=user_id)
         balance = summary['balance']
         msg = f"{today.year}年{today.month}月の収支:\n購入: {summary['total_bet']}円\n払戻: {summary['total_return']}円\n収支: {balance:+d}円"
         line_bot_api.reply_message(event.reply_token, TextSendMessage(text=msg))
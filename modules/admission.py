@@ -0,0 +1,226 @@
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import re
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, List, Optional
+
+from starlette.responses import JSONResponse
+
+
+class PriorityLimiter:
+    """
+    Async concurrency limiter. When a slot frees up it goes to the waiter
+    with the lowest priority number (FIFO within the same priority).
+    """
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.active = 0
+        self.waiting = 0
+        self._waiters = [] # heap of (priority, seq, future)
+        self._seq = itertools.count()
+
+    async def acquire(self, priority: int, timeout: float):
+        if self.active < self.capacity and not self.waiting:
+            self.active += 1
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(fut, timeout)
+        except BaseException:
+            if fut.done() and not fut.cancelled():
+                # The slot was handed over just as we gave up: pass it on
+                self.release()
+            else:
+                fut.cancel()
+                self.waiting -= 1
+            raise
+
+    def release(self):
+        # Hand the slot directly to the next live waiter, keeping active unchanged
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                self.waiting -= 1
+                fut.set_result(None)
+                return
+        self.active -= 1
+
+
+@dataclass
+class RouteClass:
+    name: str
+    prefixes: List[str]
+    priority: int # lower runs first when the server is saturated
+    max_concurrent: int
+    max_queue: int
+    timeout: float # max seconds spent waiting for a slot
+    limiter: PriorityLimiter = None
+    admitted: int = 0
+    rejected: int = 0
+    timed_out: int = 0
+    avg_service_time: float = 0.1
+    wait_times: Deque[float] = field(default_factory=lambda: deque(maxlen=1024))
+
+    def __post_init__(self):
+        self.limiter = PriorityLimiter(self.max_concurrent)
+
+    def matches(self, path: str) -> bool:
+        return any(path == p or path.startswith(p.rstrip("/") + "/") for p in self.prefixes)
+
+    def retry_after(self) -> int:
+        """Rough seconds until the current queue drains"""
+        backlog = self.limiter.waiting + self.limiter.active
+        return max(1, math.ceil(self.avg_service_time * backlog / self.max_concurrent))
+
+    def record_service_time(self, seconds: float):
+        # Exponentially weighted moving average
+        self.avg_service_time = 0.8 * self.avg_service_time + 0.2 * seconds
+
+    def stats(self) -> dict:
+        waits = sorted(self.wait_times)
+        def pct(p):
+            if not waits:
+                return 0.0
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))] * 1000, 1)
+        return {
+            "priority": self.priority,
+            "active": self.limiter.active,
+            "waiting": self.limiter.waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "wait_ms_p50": pct(0.50),
+            "wait_ms_p99": pct(0.99),
+            "avg_service_ms": round(self.avg_service_time * 1000, 1),
+        }
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, str(default)))
+
+
+def default_route_classes() -> List[RouteClass]:
+    # First match wins, so specific paths come before the generic /api/ class
+    return [
+        RouteClass("webhook", ["/callback"], priority=0,
+                   max_concurrent=16, max_queue=64, timeout=5.0),
+        RouteClass("scan", ["/api/scan_image"], priority=10,
+                   max_concurrent=_env_int("SCAN_MAX_CONCURRENT", 2),
+                   max_queue=_env_int("SCAN_MAX_QUEUE", 8), timeout=20.0),
+        RouteClass("export", ["/api/export"], priority=8,
+                   max_concurrent=2, max_queue=4, timeout=10.0),
+        RouteClass("api", ["/api"], priority=1,
+                   max_concurrent=32, max_queue=128, timeout=5.0),
+    ]
+
+
+class AdmissionController:
+    """
+    Per-route concurrency limits with bounded wait queues, plus a global
+    in-flight limit whose free slots are given to higher-priority routes first.
+    Paths that match no route class (static files, etc.) are not limited.
+    """
+    def __init__(self, route_classes: List[RouteClass] = None, max_inflight: int = None,
+                 exempt_patterns: List[str] = None):
+        self.route_classes = route_classes if route_classes is not None else default_route_classes()
+        if max_inflight is None:
+            max_inflight = _env_int("ADMISSION_MAX_INFLIGHT", 32)
+        self.global_limiter = PriorityLimiter(max_inflight)
+        # Regexes (full match) for paths that are never limited, e.g. long-lived streams
+        self.exempt_patterns = [re.compile(p) for p in (exempt_patterns or [])]
+
+    def classify(self, path: str) -> Optional[RouteClass]:
+        if any(p.fullmatch(path) for p in self.exempt_patterns):
+            return None
+        for rc in self.route_classes:
+            if rc.matches(path):
+                return rc
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "global": {
+                "active": self.global_limiter.active,
+                "waiting": self.global_limiter.waiting,
+                "capacity": self.global_limiter.capacity,
+            },
+            "routes": {rc.name: rc.stats() for rc in self.route_classes},
+        }
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying an AdmissionController to HTTP requests"""
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rc = self.controller.classify(scope["path"])
+        if rc is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Queue full: reject immediately instead of letting latency pile up
+        if rc.limiter.waiting >= rc.max_queue:
+            rc.rejected += 1
+            await self._reject(scope, receive, send, 429, "混雑しています。しばらくしてから再度お試しください", rc)
+            return
+
+        enqueued_at = time.monotonic()
+        try:
+            await rc.limiter.acquire(rc.priority, rc.timeout)
+        except asyncio.TimeoutError:
+            rc.timed_out += 1
+            await self._reject(scope, receive, send, 503, "混雑のためタイムアウトしました", rc)
+            return
+
+        try:
+            remaining = max(0.0, rc.timeout - (time.monotonic() - enqueued_at))
+            try:
+                await self.controller.global_limiter.acquire(rc.priority, remaining)
+            except asyncio.TimeoutError:
+                rc.timed_out += 1
+                await self._reject(scope, receive, send, 503, "混雑のためタイムアウトしました", rc)
+                return
+
+            try:
+                started_at = time.monotonic()
+                wait = started_at - enqueued_at
+                rc.wait_times.append(wait)
+                rc.admitted += 1
+
+                async def send_with_wait(message):
+                    if message["type"] == "http.response.start":
+                        headers = list(message.get("headers", []))
+                        headers.append((b"x-queue-wait-ms", f"{wait * 1000:.1f}".encode()))
+                        message = {**message, "headers": headers}
+                    await send(message)
+
+                await self.app(scope, receive, send_with_wait)
+                rc.record_service_time(time.monotonic() - started_at)
+            finally:
+                self.controller.global_limiter.release()
+        finally:
+            rc.limiter.release()
+
+    async def _reject(self, scope, receive, send, status_code: int, detail: str, rc: RouteClass):
+        response = JSONResponse(
+            {"detail": detail},
+            status_code=status_code,
+            headers={"Retry-After": str(rc.retry_after())}
+        )
+        await response(scope, receive, send)
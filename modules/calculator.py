@@ -1,15 +1,17 @@
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Date, select
+import argparse
+from sqlalchemy import create_engine, Column, Integer, String, Date, Index, select, update, func, inspect, text
 from sqlalchemy.orm import declarative_base, sessionmaker
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 import pandas as pd
-from typing import List, Tuple
+from typing import Callable, Iterator, List, Optional, Tuple
 
 Base = declarative_base()
 
 class Bet(Base):
     __tablename__ = 'bets'
     id = Column(Integer, primary_key=True)
+    user_id = Column(String) # LINE user ID of the owner (NULL only for rows from before per-user ledgers)
     date = Column(Date)
     place = Column(String)
     race_num = Column(Integer)
@@ -19,6 +21,46 @@ class Bet(Base):
     payout = Column(Integer, default=0)
     result = Column(String, default="未") # 未, 的中, ハズレ
 
+    __table_args__ = (
+        # Per-user monthly lookups are range scans on this index
+        Index('ix_bets_user_id_date', 'user_id', 'date'),
+    )
+
+# Postgres only: hash-partition the bets table by user when created fresh.
+# PRIMARY KEY must include the partition key, so it is (id, user_id) there.
+PARTITIONED_BETS_DDL = """
+CREATE TABLE bets (
+    id SERIAL,
+    user_id VARCHAR NOT NULL,
+    date DATE,
+    place VARCHAR,
+    race_num INTEGER,
+    bet_type VARCHAR,
+    buy_details VARCHAR,
+    amount INTEGER,
+    payout INTEGER,
+    result VARCHAR,
+    PRIMARY KEY (id, user_id)
+) PARTITION BY HASH (user_id)
+"""
+
+def _month_range(year: int, month: int) -> Tuple[date, date]:
+    """Returns [first day of month, first day of next month)"""
+    start = date(year, month, 1)
+    if month == 12:
+        end = date(year + 1, 1, 1)
+    else:
+        end = date(year, month + 1, 1)
+    return start, end
+
+def _day_totals(day: date, total_bet: int, total_return: int) -> dict:
+    return {
+        "date": day.strftime("%Y-%m-%d"),
+        "total_bet": total_bet,
+        "total_return": total_return,
+        "balance": total_return - total_bet
+    }
+
 class Calculator:
     def __init__(self, db_url: str = None):
         # Use DATABASE_URL env var or default to local sqlite
@@ -32,10 +74,68 @@ class Calculator:
             connect_args = {}
             
         self.engine = create_engine(db_url, connect_args=connect_args)
+
+        # BETS_PARTITIONS=N hash-partitions a new Postgres bets table into N partitions
+        partitions = int(os.environ.get("BETS_PARTITIONS", "0"))
+        if partitions > 0 and self.engine.dialect.name == "postgresql":
+            self._create_partitioned_bets(partitions)
+
+        self._migrate_user_column()
         Base.metadata.create_all(self.engine)
         self.Session = sessionmaker(bind=self.engine)
 
-    def add_bet(self, bet_date_str: str, place: str, race_num: int, bet_type: str, buy_details: str, amount: int):
+        # Called as listener(user_id, day, bet_delta, return_delta) after a bet is committed
+        self._listeners: List[Callable[[Optional[str], date, int, int], None]] = []
+
+    def add_listener(self, listener: Callable[[Optional[str], date, int, int], None]):
+        self._listeners.append(listener)
+
+    def _notify(self, user_id: Optional[str], day: date, bet_delta: int, return_delta: int):
+        for listener in self._listeners:
+            try:
+                listener(user_id, day, bet_delta, return_delta)
+            except Exception as e:
+                print(f"Error in bet listener: {e}")
+
+    def _create_partitioned_bets(self, partitions: int):
+        if inspect(self.engine).has_table(Bet.__tablename__):
+            return
+        with self.engine.begin() as conn:
+            conn.execute(text(PARTITIONED_BETS_DDL))
+            for i in range(partitions):
+                conn.execute(text(
+                    f"CREATE TABLE bets_p{i} PARTITION OF bets "
+                    f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {i})"
+                ))
+        print(f"Created bets table with {partitions} hash partitions")
+
+    def _migrate_user_column(self):
+        # create_all() neither alters existing tables nor adds their missing indexes,
+        # so bring older databases (and the raw-DDL partitioned table) up to date here.
+        # Existing rows keep user_id NULL (the old shared ledger) until
+        # `python -m modules.calculator --assign-legacy <user_id>` gives them an owner.
+        insp = inspect(self.engine)
+        if not insp.has_table(Bet.__tablename__):
+            return
+        columns = [c["name"] for c in insp.get_columns(Bet.__tablename__)]
+        with self.engine.begin() as conn:
+            if "user_id" not in columns:
+                conn.execute(text("ALTER TABLE bets ADD COLUMN user_id VARCHAR"))
+                print("Migrated bets table: added user_id column")
+            for index in Bet.__table__.indexes:
+                index.create(conn, checkfirst=True)
+
+    def _user_filter(self, user_id: Optional[str]):
+        # user_id=None means every user's bets (CLI / admin use)
+        if user_id is None:
+            return []
+        return [Bet.user_id == user_id]
+
+    def add_bet(self, bet_date_str: str, place: str, race_num: int, bet_type: str, buy_details: str, amount: int, user_id: str):
+        # Every new bet has an owner (the partitioned Postgres table rejects NULL user_id)
+        if not user_id:
+            raise ValueError("user_id is required")
+
         session = self.Session()
         try:
             # Date format expected: YYYYMMDD in older code, but let's standardize or handle both
@@ -49,6 +149,7 @@ class Calculator:
                     dt = date.today()
 
             bet = Bet(
+                user_id=user_id,
                 date=dt,
                 place=place,
                 race_num=race_num,
@@ -62,51 +163,105 @@ class Calculator:
         except Exception as e:
             session.rollback()
             print(f"Error adding bet: {e}")
+            return
         finally:
             session.close()
 
+        self._notify(user_id, dt, amount, 0)
+
     def update_result(self, bet_id: int, payout: int):
         session = self.Session()
         try:
             bet = session.get(Bet, bet_id)
-            if bet:
-                bet.payout = payout
-                bet.result = "的中" if payout > 0 else "ハズレ"
-                session.commit()
+            if not bet:
+                return
+            user_id, day, old_payout = bet.user_id, bet.date, bet.payout or 0
+            bet.payout = payout
+            bet.result = "的中" if payout > 0 else "ハズレ"
+            session.commit()
         except Exception as e:
             session.rollback()
             print(f"Error updating result: {e}")
+            return
+        finally:
+            session.close()
+
+        if payout != old_payout:
+            self._notify(user_id, day, 0, payout - old_payout)
+
+    def assign_legacy_bets(self, user_id: str) -> int:
+        """
+        Gives the bets recorded before per-user ledgers (user_id NULL) to one user.
+        Until then they only show up in the CLI's whole-ledger view.
+        Returns the number of rows updated.
+        """
+        if not user_id:
+            raise ValueError("user_id is required")
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                update(Bet).where(Bet.user_id.is_(None)).values(user_id=user_id)
+            )
+        return result.rowcount
+
+    def get_monthly_summary(self, year: int, month: int, user_id: str = None):
+        """Returns dict with total_bet, total_return, balance and per-day details"""
+        start, end = _month_range(year, month)
+        details = [
+            _day_totals(day, bet, ret)
+            for day, bet, ret in self.get_daily_balances(start, end - timedelta(days=1), user_id=user_id)
+        ]
+        total_bet = sum(d["total_bet"] for d in details)
+        total_return = sum(d["total_return"] for d in details)
+        return {
+            "total_bet": total_bet,
+            "total_return": total_return,
+            "balance": total_return - total_bet,
+            "details": details
+        }
+
+    def get_daily_balances(self, start: date, end: date, user_id: str = None) -> List[Tuple[date, int, int]]:
+        """(date, total_bet, total_return) for each day with bets, start <= date <= end"""
+        session = self.Session()
+        try:
+            # Plain date range (not extract()) so the (user_id, date) index is used,
+            # and the sums are computed by the database instead of loading every row
+            stmt = select(
+                Bet.date,
+                func.coalesce(func.sum(Bet.amount), 0),
+                func.coalesce(func.sum(Bet.payout), 0)
+            ).where(
+                Bet.date >= start,
+                Bet.date <= end,
+                *self._user_filter(user_id)
+            ).group_by(Bet.date).order_by(Bet.date)
+            return [(day, int(bet), int(ret)) for day, bet, ret in session.execute(stmt)]
         finally:
             session.close()
 
-    def get_monthly_summary(self, year: int, month: int):
-        """Returns dict with total_bet, total_return, balance"""
+    def get_daily_totals(self, day: date, user_id: str = None) -> dict:
+        """Same shape as one entry of get_monthly_summary()['details']"""
         session = self.Session()
         try:
-            from sqlalchemy import extract
-            stmt = select(Bet).where(
-                extract('year', Bet.date) == year,
-                extract('month', Bet.date) == month
+            stmt = select(
+                func.coalesce(func.sum(Bet.amount), 0),
+                func.coalesce(func.sum(Bet.payout), 0)
+            ).where(
+                Bet.date == day,
+                *self._user_filter(user_id)
             )
-            bets = session.execute(stmt).scalars().all()
-            
-            total_bet = sum(b.amount for b in bets)
-            total_return = sum(b.payout for b in bets)
-            return {
-                "total_bet": total_bet,
-                "total_return": total_return,
-                "balance": total_return - total_bet
-            }
+            bet, ret = session.execute(stmt).one()
+            return _day_totals(day, int(bet), int(ret))
         finally:
             session.close()
 
-    def get_all_bets_for_month(self, year: int, month: int) -> pd.DataFrame:
+    def get_all_bets_for_month(self, year: int, month: int, user_id: str = None) -> pd.DataFrame:
         session = self.Session()
         try:
-            from sqlalchemy import extract
+            start, end = _month_range(year, month)
             stmt = select(Bet).where(
-                extract('year', Bet.date) == year,
-                extract('month', Bet.date) == month
+                Bet.date >= start,
+                Bet.date < end,
+                *self._user_filter(user_id)
             ).order_by(Bet.date)
             
             bets = session.execute(stmt).scalars().all()
@@ -126,7 +281,41 @@ class Calculator:
         finally:
             session.close()
 
+    EXPORT_COLUMNS = ["id", "user_id", "date", "place", "race_num", "bet_type", "buy_details", "amount", "payout", "result"]
+
+    def iter_bet_chunks(self, start: date, end: date, chunk_size: int = 5000, user_id: str = None) -> Iterator[List[tuple]]:
+        """
+        Yields bets with start <= date <= end as lists of plain row tuples
+        (columns in EXPORT_COLUMNS order), at most chunk_size rows each.
+        Rows are streamed with a server-side cursor, so memory use does not
+        grow with the size of the range.
+        """
+        session = self.Session()
+        try:
+            columns = [getattr(Bet, name) for name in self.EXPORT_COLUMNS]
+            stmt = select(*columns).where(
+                Bet.date >= start,
+                Bet.date <= end,
+                *self._user_filter(user_id)
+            ).order_by(Bet.date, Bet.id)
+
+            result = session.execute(stmt.execution_options(yield_per=chunk_size))
+            for partition in result.partitions():
+                yield [tuple(row) for row in partition]
+        finally:
+            session.close()
+
 if __name__ == "__main__":
-    calc = Calculator()
-    calc.add_bet("2023-10-29", "Tokyo", 11, "WIN", "1", 1000)
-    print(calc.get_monthly_summary(2023, 10))
+    parser = argparse.ArgumentParser(description="Bet ledger maintenance")
+    parser.add_argument("--assign-legacy", metavar="USER_ID", default=None,
+                        help="Give every bet without an owner (recorded before per-user ledgers) to this LINE user")
+    parser.add_argument("--db-url", default=None, help="Defaults to DATABASE_URL or local sqlite")
+    args = parser.parse_args()
+
+    calc = Calculator(args.db_url)
+    if args.assign_legacy:
+        count = calc.assign_legacy_bets(args.assign_legacy)
+        print(f"Assigned {count} legacy bets to {args.assign_legacy}")
+    else:
+        calc.add_bet("2023-10-29", "Tokyo", 11, "WIN", "1", 1000, user_id="local")
+        print(calc.get_monthly_summary(2023, 10, user_id="local"))
@@ -0,0 +1,49 @@
+import asyncio
+from typing import Dict, Optional, Set, Tuple
+
+class BalanceBroadcaster:
+    """
+    Fans out per-day balance changes to Server-Sent Events subscribers,
+    keyed by (user_id, year, month).
+    publish() is thread-safe: Calculator writes run in the threadpool,
+    while subscriber queues live on the event loop.
+    Subscribers only see changes made by the same process (one uvicorn worker).
+    """
+    def __init__(self, max_queue: int = 100):
+        self.max_queue = max_queue
+        self._subscribers: Dict[Tuple[str, int, int], Set[asyncio.Queue]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def subscribe(self, user_id: str, year: int, month: int) -> asyncio.Queue:
+        # Must be called from the event loop
+        self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.max_queue)
+        self._subscribers.setdefault((user_id, year, month), set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, year: int, month: int, queue: asyncio.Queue):
+        key = (user_id, year, month)
+        queues = self._subscribers.get(key)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[key]
+
+    def has_subscribers(self, user_id: str, year: int, month: int) -> bool:
+        return (user_id, year, month) in self._subscribers
+
+    def publish(self, user_id: str, year: int, month: int, event: dict):
+        if self._loop is None or not self.has_subscribers(user_id, year, month):
+            return
+        self._loop.call_soon_threadsafe(self._dispatch, (user_id, year, month), event)
+
+    def _dispatch(self, key: Tuple[str, int, int], event: dict):
+        for queue in list(self._subscribers.get(key, ())):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow client: drop its backlog and tell it to reload the full summary
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
@@ -0,0 +1,145 @@
+import csv
+import io
+import argparse
+from datetime import date, datetime
+from typing import Iterator
+
+from .calculator import Calculator
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+EXPORT_FORMATS = ("csv", "parquet")
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Write-only file object that buffers bytes until drained.
+    Keeps track of the absolute position so the Parquet writer
+    can compute footer offsets even though the buffer is emptied.
+    """
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        data = bytes(b)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class Exporter:
+    def __init__(self, calculator: Calculator, chunk_size: int = 5000):
+        self.calculator = calculator
+        self.chunk_size = chunk_size
+
+    def media_type(self, fmt: str) -> str:
+        if fmt == "parquet":
+            return "application/vnd.apache.parquet"
+        return "text/csv; charset=utf-8"
+
+    def iter_export(self, start: date, end: date, fmt: str = "csv", user_id: str = None) -> Iterator[bytes]:
+        if fmt == "csv":
+            return self.iter_csv(start, end, user_id)
+        if fmt == "parquet":
+            return self.iter_parquet(start, end, user_id)
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    def iter_csv(self, start: date, end: date, user_id: str = None) -> Iterator[bytes]:
+        """Yields the CSV export one database chunk at a time."""
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+
+        writer.writerow(Calculator.EXPORT_COLUMNS)
+        for rows in self.calculator.iter_bet_chunks(start, end, self.chunk_size, user_id):
+            writer.writerows(rows)
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate(0)
+
+        # Header only (no rows in range)
+        if buf.tell():
+            yield buf.getvalue().encode("utf-8")
+
+    def iter_parquet(self, start: date, end: date, user_id: str = None) -> Iterator[bytes]:
+        """Yields the Parquet export, writing one row group per database chunk."""
+        if pa is None:
+            raise RuntimeError("pyarrow is required for Parquet export")
+
+        schema = pa.schema([
+            ("id", pa.int64()),
+            ("user_id", pa.string()),
+            ("date", pa.date32()),
+            ("place", pa.string()),
+            ("race_num", pa.int32()),
+            ("bet_type", pa.string()),
+            ("buy_details", pa.string()),
+            ("amount", pa.int64()),
+            ("payout", pa.int64()),
+            ("result", pa.string()),
+        ])
+
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+        try:
+            for rows in self.calculator.iter_bet_chunks(start, end, self.chunk_size, user_id):
+                # Transpose row tuples into columns for Arrow
+                columns = [list(col) for col in zip(*rows)]
+                batch = pa.RecordBatch.from_arrays(
+                    [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+                    schema=schema
+                )
+                writer.write_batch(batch)
+                data = sink.drain()
+                if data:
+                    yield data
+        finally:
+            writer.close()
+
+        yield sink.drain()
+
+
+def _parse_date(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export bet history as CSV or Parquet")
+    parser.add_argument("--start", type=_parse_date, required=True, help="YYYY-MM-DD (inclusive)")
+    parser.add_argument("--end", type=_parse_date, required=True, help="YYYY-MM-DD (inclusive)")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--output", required=True, help="Output file path")
+    parser.add_argument("--user-id", default=None, help="Only export this LINE user's bets")
+    parser.add_argument("--db-url", default=None, help="Defaults to DATABASE_URL or local sqlite")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    exporter = Exporter(Calculator(args.db_url), chunk_size=args.chunk_size)
+
+    written = 0
+    with open(args.output, "wb") as f:
+        for data in exporter.iter_export(args.start, args.end, args.format, args.user_id):
+            f.write(data)
+            written += len(data)
+
+    print(f"Exported {args.start} - {args.end} to {args.output} ({written} bytes)")
+
+
+if __name__ == "__main__":
+    main()
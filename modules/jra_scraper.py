@@ -1,7 +1,7 @@
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 import re
-from typing import Dict, List
+from typing import Dict, List, Union
 from dataclasses import dataclass
 
 @dataclass
@@ -10,6 +10,62 @@ class RaceResult:
     combinations: List[str] # [1], [1, 2]
     payouts: List[int] # [250], [110, 140]
 
+# Only the payout tables are needed, so skip building the tree for the rest of the page
+PAYOUT_TABLES = SoupStrainer('table', attrs={'class': 'pay_table_01'})
+
+def parse_payout_html(html: Union[str, bytes]) -> List[RaceResult]:
+    """
+    Parses the payout tables of a netkeiba race page (db.netkeiba.com/race/<race_id>/).
+    Module-level and network-free so archived pages can be parsed in worker processes.
+    """
+    soup = BeautifulSoup(html, 'html.parser', parse_only=PAYOUT_TABLES)
+
+    results = []
+
+    # Payout tables
+    # Usually found in <dl class="pay_block"> or <table class="pay_table_01">
+    tables = soup.find_all('table', class_='pay_table_01')
+
+    for table in tables:
+        rows = table.find_all('tr')
+        for row in rows:
+            th = row.find('th')
+            if not th: continue
+            bet_type = th.text.strip()
+
+            tds = row.find_all('td')
+            if len(tds) < 2: continue
+
+            # Extract combinations and payouts
+            # They are separated by <br> tags
+            combinations_raw = tds[0].decode_contents()
+            payouts_raw = tds[1].decode_contents()
+
+            # Split by <br> or <br/>
+            combs_list = re.split(r'<br\s*/?>', combinations_raw)
+            pays_list = re.split(r'<br\s*/?>', payouts_raw)
+
+            # Clean up extracted strings
+            clean_combs = []
+            for c in combs_list:
+                # Remove HTML tags if any left (e.g. formatting) and whitespace
+                text = BeautifulSoup(c, 'html.parser').text.strip()
+                if text:
+                    clean_combs.append(text)
+
+            clean_pays = []
+            for p in pays_list:
+                text = BeautifulSoup(p, 'html.parser').text.strip()
+                if text:
+                    try:
+                        clean_pays.append(int(text.replace(',', '')))
+                    except:
+                        pass
+
+            results.append(RaceResult(bet_type, clean_combs, clean_pays))
+
+    return results
+
 class JRAScraper:
     def __init__(self):
         self.headers = {
@@ -27,6 +83,27 @@ class JRAScraper:
         res.encoding = 'EUC-JP'
         return BeautifulSoup(res.content, 'html.parser')
 
+    def list_race_ids(self, date_str: str) -> List[str]:
+        """
+        All race IDs held on a date (YYYYMMDD), in page order.
+        """
+        url = f"https://db.netkeiba.com/race/list/{date_str}/"
+        soup = self._get_soup(url)
+
+        race_ids = []
+        for link in soup.find_all('a', href=re.compile(r"/race/\d{12}")):
+            race_id = link.get('href').split('/')[2]
+            if race_id not in race_ids:
+                race_ids.append(race_id)
+        return race_ids
+
+    def fetch_race_html(self, race_id: str) -> bytes:
+        """Raw race page, e.g. for archiving before parse_payout_html"""
+        url = f"https://db.netkeiba.com/race/{race_id}/"
+        res = requests.get(url, headers=self.headers)
+        res.raise_for_status()
+        return res.content
+
     def find_race_id(self, date_str: str, place_name: str, race_num: int) -> str:
         """
         Find race ID from date, place name (kanji), and race number.
@@ -65,54 +142,7 @@ class JRAScraper:
         return None
 
     def get_payout(self, race_id: str) -> List[RaceResult]:
-        url = f"https://db.netkeiba.com/race/{race_id}/"
-        soup = self._get_soup(url)
-        
-        results = []
-        
-        # Payout tables
-        # Usually found in <dl class="pay_block"> or <table class="pay_table_01">
-        tables = soup.find_all('table', class_='pay_table_01')
-        
-        for table in tables:
-            rows = table.find_all('tr')
-            for row in rows:
-                th = row.find('th')
-                if not th: continue
-                bet_type = th.text.strip()
-                
-                tds = row.find_all('td')
-                if len(tds) < 2: continue
-                
-                # Extract combinations and payouts
-                # They are separated by <br> tags
-                combinations_raw = tds[0].decode_contents()
-                payouts_raw = tds[1].decode_contents()
-                
-                # Split by <br> or <br/>
-                combs_list = re.split(r'<br\s*/?>', combinations_raw)
-                pays_list = re.split(r'<br\s*/?>', payouts_raw)
-                
-                # Clean up extracted strings
-                clean_combs = []
-                for c in combs_list:
-                    # Remove HTML tags if any left (e.g. formatting) and whitespace
-                    text = BeautifulSoup(c, 'html.parser').text.strip()
-                    if text:
-                        clean_combs.append(text)
-                        
-                clean_pays = []
-                for p in pays_list:
-                    text = BeautifulSoup(p, 'html.parser').text.strip()
-                    if text:
-                        try:
-                            clean_pays.append(int(text.replace(',', '')))
-                        except:
-                            pass
-                            
-                results.append(RaceResult(bet_type, clean_combs, clean_pays))
-                
-        return results
+        return parse_payout_html(self.fetch_race_html(race_id))
 
 if __name__ == "__main__":
     scraper = NetkeibaScraper()
@@ -0,0 +1,112 @@
+import os
+import time
+import secrets
+import threading
+import requests
+from typing import Dict, Optional, Tuple
+
+class LIFFAuthenticator:
+    """
+    Verifies LIFF ID tokens (liff.getIDToken()) against the LINE Login API
+    and returns the LINE user ID ("sub") of the caller.
+    Verified tokens are cached until shortly before they expire so that
+    every API call does not cost a round trip to LINE.
+    """
+    VERIFY_URL = "https://api.line.me/oauth2/v2.1/verify"
+    MAX_CACHE_SIZE = 4096
+
+    # Channel part of the LIFF ID used by static/js (2009134533-h8bU1BkZ)
+    DEFAULT_CHANNEL_ID = "2009134533"
+
+    def __init__(self, channel_id: str = None, cache_ttl: int = 300):
+        # LINE Login channel ID that owns the LIFF app (the part of LIFF ID before "-")
+        if channel_id is None:
+            channel_id = os.environ.get("LINE_LOGIN_CHANNEL_ID", self.DEFAULT_CHANNEL_ID)
+        if not channel_id:
+            # LINE rejects every token without a client_id, so all authenticated APIs would return 401
+            print("WARNING: LINE_LOGIN_CHANNEL_ID is empty. LIFF authentication will reject every request.")
+        self.channel_id = channel_id
+        self.cache_ttl = cache_ttl
+
+        self._cache: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def verify(self, id_token: str) -> Optional[str]:
+        """Returns the LINE user ID for a valid token, otherwise None"""
+        if not id_token:
+            return None
+
+        now = time.time()
+        with self._lock:
+            cached = self._cache.get(id_token)
+        if cached and cached[1] > now:
+            return cached[0]
+
+        try:
+            res = requests.post(
+                self.VERIFY_URL,
+                data={"id_token": id_token, "client_id": self.channel_id},
+                timeout=5
+            )
+        except requests.RequestException as e:
+            print(f"LIFF verify error: {e}")
+            return None
+
+        if res.status_code != 200:
+            print(f"LIFF verify rejected: {res.status_code} {res.text}")
+            return None
+
+        payload = res.json()
+        user_id = payload.get("sub")
+        if not user_id:
+            return None
+
+        expires_at = min(float(payload.get("exp", now)), now + self.cache_ttl)
+        with self._lock:
+            if len(self._cache) >= self.MAX_CACHE_SIZE:
+                self._evict_expired(now)
+            self._cache[id_token] = (user_id, expires_at)
+
+        return user_id
+
+    def _evict_expired(self, now: float):
+        expired = [k for k, (_, exp) in self._cache.items() if exp <= now]
+        for k in expired:
+            del self._cache[k]
+        # Still full: drop everything rather than grow without bound
+        if len(self._cache) >= self.MAX_CACHE_SIZE:
+            self._cache.clear()
+
+class StreamTicketStore:
+    """
+    Short-lived, single-use tickets for EventSource URLs.
+    EventSource cannot send an Authorization header, and putting the ID token in the
+    query string would write it to access logs, so a header-authenticated request
+    exchanges it for a random ticket that is only good for opening one stream.
+    Tickets are kept in memory, so the stream must hit the worker that issued them.
+    """
+    def __init__(self, ttl: int = 30):
+        self.ttl = ttl
+        self._tickets: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def issue(self, user_id: str) -> str:
+        now = time.time()
+        ticket = secrets.token_urlsafe(32)
+        with self._lock:
+            # Drop expired tickets that were never used
+            expired = [k for k, (_, exp) in self._tickets.items() if exp <= now]
+            for k in expired:
+                del self._tickets[k]
+            self._tickets[ticket] = (user_id, now + self.ttl)
+        return ticket
+
+    def redeem(self, ticket: str) -> Optional[str]:
+        """Returns the user ID for a valid ticket and invalidates it, otherwise None"""
+        if not ticket:
+            return None
+        with self._lock:
+            entry = self._tickets.pop(ticket, None)
+        if entry is None or entry[1] <= time.time():
+            return None
+        return entry[0]
@@ -0,0 +1,252 @@
+import os
+import re
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import Column, Integer, String, DateTime, Index, select, delete, insert
+
+from .calculator import Base, Calculator
+from .jra_scraper import JRAScraper, RaceResult, parse_payout_html
+
+class RacePayout(Base):
+    """Official payout for one winning combination of one race (one row per RaceResult entry)"""
+    __tablename__ = 'race_payouts'
+    id = Column(Integer, primary_key=True)
+    race_id = Column(String, nullable=False) # netkeiba race ID: YYYYPPKKDDRR
+    bet_type = Column(String, nullable=False) # 単勝, 複勝, etc.
+    combination = Column(String, nullable=False) # "1", "3 - 5"
+    payout = Column(Integer, nullable=False) # Yen per 100 Yen
+
+    __table_args__ = (
+        Index('ix_race_payouts_race_id_bet_type', 'race_id', 'bet_type'),
+    )
+
+class PayoutImport(Base):
+    """Checkpoint: races whose payouts are already in race_payouts"""
+    __tablename__ = 'payout_imports'
+    race_id = Column(String, primary_key=True)
+    source = Column(String)
+    rows = Column(Integer)
+    imported_at = Column(DateTime)
+
+RACE_ID_PATTERN = re.compile(r"(\d{12})")
+HTML_EXTENSIONS = (".html", ".htm")
+
+def race_id_from_path(path: str) -> Optional[str]:
+    """Archived pages are expected to carry the race ID in the file name, e.g. 202305050811.html"""
+    m = RACE_ID_PATTERN.search(os.path.basename(path))
+    return m.group(1) if m else None
+
+def _parse_archived_page(path: str) -> Tuple[str, Optional[List[RaceResult]], Optional[str]]:
+    # Runs in worker processes. Errors are returned rather than raised so that
+    # one bad page does not abort pool.map() and lose the rest of the batch.
+    try:
+        with open(path, 'rb') as f:
+            return path, parse_payout_html(f.read()), None
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}"
+
+class PayoutStore:
+    def __init__(self, calculator_or_url=None):
+        if isinstance(calculator_or_url, Calculator):
+            self.calculator = calculator_or_url
+        else:
+            self.calculator = Calculator(calculator_or_url)
+        Base.metadata.create_all(self.calculator.engine)
+        self.Session = self.calculator.Session
+
+    def imported_race_ids(self) -> Set[str]:
+        session = self.Session()
+        try:
+            return set(session.execute(select(PayoutImport.race_id)).scalars())
+        finally:
+            session.close()
+
+    def import_results(self, results: Dict[str, Tuple[str, List[RaceResult]]]):
+        """
+        Bulk-loads {race_id: (source, [RaceResult])} in one transaction.
+        Existing rows for those races are replaced, so re-importing is idempotent.
+        """
+        if not results:
+            return
+
+        race_ids = list(results.keys())
+        payout_rows = []
+        import_rows = []
+        now = datetime.now()
+        for race_id, (source, race_results) in results.items():
+            count = 0
+            for r in race_results:
+                # Combinations and payouts are parallel lists (e.g. 複勝 has one per horse)
+                for comb, pay in zip(r.combinations, r.payouts):
+                    payout_rows.append({
+                        "race_id": race_id,
+                        "bet_type": r.bet_type,
+                        "combination": comb,
+                        "payout": pay
+                    })
+                    count += 1
+            import_rows.append({"race_id": race_id, "source": source, "rows": count, "imported_at": now})
+
+        session = self.Session()
+        try:
+            session.execute(delete(RacePayout).where(RacePayout.race_id.in_(race_ids)))
+            session.execute(delete(PayoutImport).where(PayoutImport.race_id.in_(race_ids)))
+            if payout_rows:
+                session.execute(insert(RacePayout), payout_rows)
+            session.execute(insert(PayoutImport), import_rows)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def get_payouts(self, race_id: str) -> List[RaceResult]:
+        """Same shape as JRAScraper.get_payout, served from the local table"""
+        session = self.Session()
+        try:
+            stmt = select(RacePayout).where(RacePayout.race_id == race_id).order_by(RacePayout.id)
+            grouped: Dict[str, RaceResult] = {}
+            for row in session.execute(stmt).scalars():
+                result = grouped.setdefault(row.bet_type, RaceResult(row.bet_type, [], []))
+                result.combinations.append(row.combination)
+                result.payouts.append(row.payout)
+            return list(grouped.values())
+        finally:
+            session.close()
+
+class PayoutBackfill:
+    """
+    Imports historical payouts from archived netkeiba race pages.
+    Pages are parsed in a process pool and committed in batches; each batch
+    also records its races in payout_imports, so an interrupted run resumes
+    where it stopped.
+    """
+    def __init__(self, store: PayoutStore, workers: int = None, batch_size: int = 500):
+        self.store = store
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+
+    def _pending_pages(self, directory: str, force: bool) -> List[str]:
+        done = set() if force else self.store.imported_race_ids()
+        pages = []
+        for root, _, files in os.walk(directory):
+            for name in sorted(files):
+                if not name.lower().endswith(HTML_EXTENSIONS):
+                    continue
+                race_id = race_id_from_path(name)
+                if race_id and race_id not in done:
+                    pages.append(os.path.join(root, name))
+        return pages
+
+    def import_directory(self, directory: str, force: bool = False) -> int:
+        """
+        Parses every not-yet-imported <race_id>.html under directory. Returns races imported.
+        Unreadable pages and pages without a payout table (e.g. saved before the race was
+        settled) are reported and left unchecked, so the next run tries them again.
+        """
+        pages = self._pending_pages(directory, force)
+        print(f"Backfill: {len(pages)} pages to import from {directory} ({self.workers} workers)")
+        if not pages:
+            return 0
+
+        started = time.time()
+        imported = 0
+        failed = 0
+        empty = 0
+        batch: Dict[str, Tuple[str, List[RaceResult]]] = {}
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            chunksize = max(1, min(64, len(pages) // (self.workers * 4)))
+            for path, race_results, error in pool.map(_parse_archived_page, pages, chunksize=chunksize):
+                if error:
+                    failed += 1
+                    print(f"Backfill: failed to parse {path}: {error}")
+                    continue
+                if not race_results:
+                    empty += 1
+                    print(f"Backfill: no payouts in {path}, skipped")
+                    continue
+                batch[race_id_from_path(path)] = (path, race_results)
+                if len(batch) >= self.batch_size:
+                    self.store.import_results(batch)
+                    imported += len(batch)
+                    batch = {}
+                    print(f"Backfill: {imported}/{len(pages)} races ({time.time() - started:.1f}s)")
+
+        self.store.import_results(batch)
+        imported += len(batch)
+        print(f"Backfill: imported {imported} races in {time.time() - started:.1f}s"
+              f" ({failed} failed, {empty} without payouts)")
+        return imported
+
+    def archive_date_range(self, start: date, end: date, directory: str, scraper: JRAScraper = None,
+                           delay: float = 1.0) -> int:
+        """
+        Downloads race pages for start..end into directory (skipping pages already there),
+        so they can be imported offline with import_directory. Returns pages downloaded.
+        """
+        scraper = scraper or JRAScraper()
+        os.makedirs(directory, exist_ok=True)
+
+        downloaded = 0
+        for day in _date_range(start, end):
+            try:
+                race_ids = scraper.list_race_ids(day.strftime("%Y%m%d"))
+            except Exception as e:
+                print(f"Backfill: failed to list races on {day}: {e}")
+                continue
+
+            for race_id in race_ids:
+                path = os.path.join(directory, f"{race_id}.html")
+                if os.path.exists(path):
+                    continue
+                try:
+                    html = scraper.fetch_race_html(race_id)
+                except Exception as e:
+                    print(f"Backfill: failed to fetch {race_id}: {e}")
+                    continue
+                # Write then rename so an interrupted download never looks complete
+                with open(path + ".part", 'wb') as f:
+                    f.write(html)
+                os.replace(path + ".part", path)
+                downloaded += 1
+                time.sleep(delay) # Be polite to netkeiba
+
+        print(f"Backfill: downloaded {downloaded} pages into {directory}")
+        return downloaded
+
+def _date_range(start: date, end: date) -> Iterator[date]:
+    day = start
+    while day <= end:
+        yield day
+        day += timedelta(days=1)
+
+def _parse_date(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill historical race payouts")
+    parser.add_argument("--dir", required=True, help="Directory of archived <race_id>.html pages")
+    parser.add_argument("--start", type=_parse_date, help="YYYY-MM-DD: download this range into --dir first")
+    parser.add_argument("--end", type=_parse_date, help="YYYY-MM-DD (inclusive)")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=500, help="Races per commit / checkpoint")
+    parser.add_argument("--force", action="store_true", help="Re-import races that are already checkpointed")
+    parser.add_argument("--db-url", default=None, help="Defaults to DATABASE_URL or local sqlite")
+    args = parser.parse_args(argv)
+
+    store = PayoutStore(args.db_url)
+    backfill = PayoutBackfill(store, workers=args.workers, batch_size=args.batch_size)
+
+    if args.start:
+        backfill.archive_date_range(args.start, args.end or args.start, args.dir)
+
+    backfill.import_directory(args.dir, force=args.force)
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
 import matplotlib
 matplotlib.use('Agg') # Use non-interactive backend
 import matplotlib.pyplot as plt
-import pandas as pd
+import numpy as np
+import calendar
+from datetime import date
 from .calculator import Calculator
+from .series import cumulative_balance_series
 import os
 
 class Reporter:
@@ -12,22 +15,25 @@ class Reporter:
         else:
             self.calculator = calculator_or_path
 
-    def generate_monthly_chart(self, year: int, month: int, output_path: str = "data/chart.png") -> str:
-        data = self.calculator.get_all_bets_for_month(year, month)
-        if not data:
+    def generate_monthly_chart(self, year: int, month: int, output_path: str = "data/chart.png", user_id: str = None) -> str:
+        last_day = calendar.monthrange(year, month)[1]
+        return self.generate_balance_chart(
+            date(year, month, 1), date(year, month, last_day), output_path,
+            title=f"Cumulative Balance - {year}/{month:02d}", user_id=user_id
+        )
+
+    def generate_balance_chart(self, start: date, end: date, output_path: str = "data/chart.png",
+                               title: str = None, user_id: str = None, max_points: int = 500) -> str:
+        """Cumulative balance chart for any range (a month, a season, several years)"""
+        days, balances, total = cumulative_balance_series(self.calculator, start, end, max_points, user_id=user_id)
+        if total == 0:
             return None
-            
-        df = pd.DataFrame(data, columns=['date', 'amount', 'payout', 'status'])
-        df['date'] = pd.to_datetime(df['date'])
-        
-        # Group by date for daily summary
-        daily_summary = df.groupby('date').sum(numeric_only=True).reset_index()
-        daily_summary['balance'] = daily_summary['payout'] - daily_summary['amount']
-        daily_summary['cumulative_balance'] = daily_summary['balance'].cumsum()
+
+        dates = np.datetime64('1970-01-01', 'D') + days.astype('timedelta64[D]')
 
         plt.figure(figsize=(10, 6))
-        plt.plot(daily_summary['date'], daily_summary['cumulative_balance'], marker='o', linestyle='-')
-        plt.title(f"Cumulative Balance - {year}/{month:02d}")
+        plt.plot(dates, balances, marker='o' if len(dates) <= 31 else None, linestyle='-')
+        plt.title(title or f"Cumulative Balance - {start} - {end}")
         plt.xlabel("Date")
         plt.ylabel("Balance (Yen)")
         plt.grid(True)
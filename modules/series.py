@@ -0,0 +1,89 @@
+import base64
+from datetime import date
+from typing import Tuple
+
+import numpy as np
+
+from .calculator import Calculator
+
+EPOCH = date(1970, 1, 1)
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+    Returns the indices of n_out points (always including the first and last)
+    that best preserve the visual shape of the line.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # n_out - 2 buckets over the interior points [1, n - 1); each holds at least one point
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+
+        # Third vertex: average of the next bucket (the last point for the final bucket)
+        if i + 2 < len(edges):
+            nlo, nhi = edges[i + 1], edges[i + 2]
+            avg_x = x[nlo:nhi].mean()
+            avg_y = y[nlo:nhi].mean()
+        else:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+
+        # Twice the triangle area for every candidate in the bucket at once
+        area = np.abs(
+            (x[a] - avg_x) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (avg_y - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return selected
+
+def downsample_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """LTTB, plus the global maximum and minimum so peaks and drawdowns are never lost"""
+    n = len(x)
+    if n <= max_points:
+        return np.arange(n)
+    if max_points < 5:
+        return lttb(x, y, max_points)
+
+    idx = lttb(x, y, max_points - 2)
+    extremes = np.array([np.argmax(y), np.argmin(y)], dtype=np.int64)
+    return np.union1d(idx, extremes)
+
+def cumulative_balance_series(calculator: Calculator, start: date, end: date, max_points: int,
+                              user_id: str = None) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Cumulative balance at each day with bets in [start, end], downsampled to max_points.
+    Returns (days since 1970-01-01 as int32, cumulative balance as float64, days before downsampling).
+    """
+    rows = calculator.get_daily_balances(start, end, user_id=user_id)
+    n = len(rows)
+
+    days = np.fromiter(((d - EPOCH).days for d, _, _ in rows), dtype=np.int32, count=n)
+    bets = np.fromiter((b for _, b, _ in rows), dtype=np.int64, count=n)
+    returns = np.fromiter((r for _, _, r in rows), dtype=np.int64, count=n)
+
+    cumulative = np.cumsum(returns - bets)
+
+    idx = downsample_indices(days, cumulative, max_points)
+    return days[idx], cumulative[idx].astype(np.float64), n
+
+def encode_typed_array(values: np.ndarray, dtype: str) -> dict:
+    """Little-endian base64 payload; decodes directly into a JS Int32Array / Float64Array"""
+    data = np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder('<'))
+    return {
+        "dtype": np.dtype(dtype).name,
+        "data": base64.b64encode(data.tobytes()).decode("ascii")
+    }
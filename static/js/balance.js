@@ -1,9 +1,14 @@
 const LIFF_ID = "2009134533-h8bU1BkZ";
 let balanceChart = null;
+let trendChart = null;
+let liffReady = null;
+let balanceStream = null;
+let streamGeneration = 0;
+let currentData = null;
 
 document.addEventListener("DOMContentLoaded", function () {
-    // Initialize LIFF
-    liff.init({ liffId: LIFF_ID })
+    // Initialize LIFF (API calls wait for this to get the ID token)
+    liffReady = liff.init({ liffId: LIFF_ID })
         .then(() => {
             if (!liff.isLoggedIn()) {
                 liff.login();
@@ -23,22 +28,43 @@ document.addEventListener("DOMContentLoaded", function () {
     // Add event listener
     dateInput.addEventListener("change", loadData);
 
+    // Long-range chart
+    document.getElementById("trend-range").addEventListener("change", loadTrend);
+
     // Initial load
     loadData();
+    loadTrend();
 });
 
+async function authHeaders() {
+    await liffReady;
+    const token = liff.getIDToken();
+    return token ? { 'Authorization': `Bearer ${token}` } : {};
+}
+
 async function loadData() {
     const val = document.getElementById("month-select").value; // "YYYY-MM"
     if (!val) return;
 
     const [year, month] = val.split("-");
 
+    // Server pushes a snapshot, then per-day updates as bets are added or settled
+    if (window.EventSource) {
+        await openStream(year, month);
+    } else {
+        await fetchSummary(year, month);
+    }
+}
+
+async function fetchSummary(year, month) {
     try {
-        const response = await fetch(`/api/balance/${year}/${parseInt(month)}`); // parseInt to remove leading zero if backend expects int
+        const response = await fetch(`/api/balance/${year}/${parseInt(month)}`, { // parseInt to remove leading zero if backend expects int
+            headers: await authHeaders()
+        });
         if (!response.ok) throw new Error("API Error");
 
-        const data = await response.json();
-        renderDashboard(data, year, month);
+        currentData = await response.json();
+        renderDashboard(currentData, year, month);
 
     } catch (e) {
         console.error(e);
@@ -46,8 +72,97 @@ async function loadData() {
     }
 }
 
+async function openStream(year, month) {
+    if (balanceStream) balanceStream.close();
+    balanceStream = null;
+    const generation = ++streamGeneration;
+
+    // Exchange the ID token (sent as a header) for a single-use ticket, so it never appears in a URL
+    let ticket = "";
+    try {
+        const response = await fetch('/api/balance/stream_ticket', {
+            method: 'POST',
+            headers: await authHeaders()
+        });
+        if (!response.ok) throw new Error("API Error");
+        ticket = (await response.json()).ticket;
+    } catch (e) {
+        console.error(e);
+        if (generation === streamGeneration) await fetchSummary(year, month);
+        return;
+    }
+
+    // The month changed (or a resync started) while we were waiting for the ticket
+    if (generation !== streamGeneration) return;
+
+    const stream = new EventSource(`/api/balance/${year}/${parseInt(month)}/stream?ticket=${encodeURIComponent(ticket)}`);
+    balanceStream = stream;
+
+    // Sent on every (re)connect
+    stream.addEventListener("snapshot", (e) => {
+        currentData = JSON.parse(e.data);
+        renderDashboard(currentData, year, month);
+    });
+
+    stream.addEventListener("delta", (e) => {
+        applyDelta(JSON.parse(e.data));
+    });
+
+    // Server dropped events for us: start over with a fresh snapshot
+    stream.addEventListener("resync", () => {
+        openStream(year, month);
+    });
+
+    stream.onerror = () => {
+        // Tickets are single-use, so EventSource's own reconnect would be refused:
+        // close it and reconnect with a fresh ticket instead
+        stream.close();
+        setTimeout(() => {
+            if (balanceStream === stream) openStream(year, month);
+        }, 3000);
+    };
+}
+
+function applyDelta(day) {
+    if (!currentData) return;
+
+    // Delta events carry the day's new totals, so replacing the entry is idempotent
+    const entry = {
+        date: day.date,
+        total_bet: day.total_bet,
+        total_return: day.total_return,
+        balance: day.balance
+    };
+    const details = currentData.details || (currentData.details = []);
+    const idx = details.findIndex(d => d.date === entry.date);
+    if (idx >= 0) {
+        details[idx] = entry;
+    } else {
+        details.push(entry);
+        details.sort((a, b) => a.date.localeCompare(b.date));
+    }
+
+    currentData.total_bet = details.reduce((sum, d) => sum + d.total_bet, 0);
+    currentData.total_return = details.reduce((sum, d) => sum + d.total_return, 0);
+    currentData.balance = currentData.total_return - currentData.total_bet;
+
+    renderSummary(currentData);
+    updateDayCell(entry);
+    updateChart(details);
+}
+
 function renderDashboard(data, year, month) {
     // 1. Text Summary
+    renderSummary(data);
+
+    // 2. Calendar Grid
+    renderCalendar(data.details, year, month);
+
+    // 3. Chart
+    renderChart(data.details, year, month);
+}
+
+function renderSummary(data) {
     document.getElementById("total-bet").innerText = data.total_bet.toLocaleString();
     document.getElementById("total-return").innerText = data.total_return.toLocaleString();
     const balEl = document.getElementById("balance");
@@ -56,12 +171,6 @@ function renderDashboard(data, year, month) {
     if (data.balance > 0) balEl.style.color = "gold";
     else if (data.balance < 0) balEl.style.color = "#ff4d4d";
     else balEl.style.color = "white";
-
-    // 2. Calendar Grid
-    renderCalendar(data.details, year, month);
-
-    // 3. Chart
-    renderChart(data.details, year, month);
 }
 
 function renderCalendar(details, year, month) {
@@ -83,41 +192,43 @@ function renderCalendar(details, year, month) {
         const dateStr = `${year}-${String(month).padStart(2, '0')}-${String(day).padStart(2, '0')}`;
 
         const cell = document.createElement("div");
-        cell.className = "day-cell";
+        cell.id = `day-${dateStr}`;
+        fillDayCell(cell, day, dailyMap[dateStr]);
 
-        const dayNum = document.createElement("div");
-        dayNum.innerText = day;
-        cell.appendChild(dayNum);
+        grid.appendChild(cell);
+    }
+}
 
-        if (dailyMap[dateStr]) {
-            const info = dailyMap[dateStr];
-            const balance = info.balance;
+function fillDayCell(cell, day, info) {
+    cell.className = "day-cell";
+    cell.innerHTML = "";
 
-            const balText = document.createElement("div");
-            balText.style.fontSize = "10px";
-            balText.innerText = (balance > 0 ? "+" : "") + balance;
-            cell.appendChild(balText);
+    const dayNum = document.createElement("div");
+    dayNum.innerText = day;
+    cell.appendChild(dayNum);
 
-            if (balance > 0) cell.classList.add("win");
-            else if (balance < 0) cell.classList.add("loss");
-        }
+    if (info) {
+        const balance = info.balance;
 
-        grid.appendChild(cell);
+        const balText = document.createElement("div");
+        balText.style.fontSize = "10px";
+        balText.innerText = (balance > 0 ? "+" : "") + balance;
+        cell.appendChild(balText);
+
+        if (balance > 0) cell.classList.add("win");
+        else if (balance < 0) cell.classList.add("loss");
     }
 }
 
-function renderChart(details, year, month) {
-    const ctx = document.getElementById("balanceChart").getContext("2d");
-
-    if (balanceChart) {
-        balanceChart.destroy();
-    }
+function updateDayCell(info) {
+    const cell = document.getElementById(`day-${info.date}`);
+    if (cell) fillDayCell(cell, parseInt(info.date.substring(8)), info);
+}
 
-    // Prepare data
+function chartSeries(details) {
     // We want cumulative balance over days
     // details only has existing days. We should fill valid days or just plot points.
     // Let's just plot active days for simplicity
-
     let labels = [];
     let dataPoints = [];
     let cumulative = 0;
@@ -129,6 +240,26 @@ function renderChart(details, year, month) {
             dataPoints.push(cumulative);
         });
     }
+    return { labels, dataPoints };
+}
+
+function updateChart(details) {
+    if (!balanceChart) return;
+
+    const { labels, dataPoints } = chartSeries(details);
+    balanceChart.data.labels = labels;
+    balanceChart.data.datasets[0].data = dataPoints;
+    balanceChart.update();
+}
+
+function renderChart(details, year, month) {
+    const ctx = document.getElementById("balanceChart").getContext("2d");
+
+    if (balanceChart) {
+        balanceChart.destroy();
+    }
+
+    const { labels, dataPoints } = chartSeries(details);
 
     balanceChart = new Chart(ctx, {
         type: 'line',
@@ -161,3 +292,82 @@ function renderChart(details, year, month) {
         }
     });
 }
+
+function decodeTypedArray(field) {
+    // Base64 little-endian payload from /api/balance/series
+    const bin = atob(field.data);
+    const bytes = new Uint8Array(bin.length);
+    for (let i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i);
+    return field.dtype === "int32" ? new Int32Array(bytes.buffer) : new Float64Array(bytes.buffer);
+}
+
+function isoDate(d) {
+    return `${d.getFullYear()}-${String(d.getMonth() + 1).padStart(2, '0')}-${String(d.getDate()).padStart(2, '0')}`;
+}
+
+async function loadTrend() {
+    const years = parseInt(document.getElementById("trend-range").value);
+    const end = new Date();
+    const start = new Date(end.getFullYear() - years, end.getMonth(), end.getDate());
+
+    try {
+        // Server computes the cumulative series and downsamples it to ~300 points
+        const response = await fetch(`/api/balance/series?start=${isoDate(start)}&end=${isoDate(end)}&points=300`, {
+            headers: await authHeaders()
+        });
+        if (!response.ok) throw new Error("API Error");
+
+        const series = await response.json();
+        const days = decodeTypedArray(series.t);
+        const values = decodeTypedArray(series.v);
+
+        const labels = Array.from(days, d => new Date(d * 86400000).toISOString().substring(0, 10));
+        renderTrendChart(labels, Array.from(values));
+
+    } catch (e) {
+        console.error(e);
+    }
+}
+
+function renderTrendChart(labels, dataPoints) {
+    if (trendChart) {
+        trendChart.data.labels = labels;
+        trendChart.data.datasets[0].data = dataPoints;
+        trendChart.update();
+        return;
+    }
+
+    const ctx = document.getElementById("trendChart").getContext("2d");
+    trendChart = new Chart(ctx, {
+        type: 'line',
+        data: {
+            labels: labels,
+            datasets: [{
+                label: '累積収支',
+                data: dataPoints,
+                borderColor: '#00b900',
+                backgroundColor: 'rgba(0, 185, 0, 0.1)',
+                pointRadius: 0,
+                tension: 0,
+                fill: true
+            }]
+        },
+        options: {
+            responsive: true,
+            animation: false,
+            scales: {
+                y: {
+                    grid: { color: '#444' },
+                    ticks: { color: '#ccc' }
+                },
+                x: {
+                    grid: { color: '#444' },
+                    ticks: { color: '#ccc', maxTicksLimit: 12 }
+                }
+            },
+            plugins: {
+                legend: { labels: { color: '#fff' } }
+            }
+        }
+    });
+}
@@ -1,8 +1,9 @@
 const LIFF_ID = "2009134533-h8bU1BkZ";
+let liffReady = null;
 
 document.addEventListener("DOMContentLoaded", function () {
-    // Initialize LIFF
-    liff.init({ liffId: LIFF_ID })
+    // Initialize LIFF (API calls wait for this to get the ID token)
+    liffReady = liff.init({ liffId: LIFF_ID })
         .then(() => {
             if (!liff.isLoggedIn()) {
                 liff.login();
@@ -53,6 +54,12 @@ document.addEventListener("DOMContentLoaded", function () {
     }
 });
 
+async function authHeaders() {
+    await liffReady;
+    const token = liff.getIDToken();
+    return token ? { 'Authorization': `Bearer ${token}` } : {};
+}
+
 async function handleFileUpload(file) {
     showLoading(true);
     const formData = new FormData();
@@ -119,7 +126,7 @@ async function registerBet(ticketItem) {
     try {
         const response = await fetch('/api/bets', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: { 'Content-Type': 'application/json', ...(await authHeaders()) },
             body: JSON.stringify({ tickets: [ticketItem] })
         });
 
@@ -0,0 +1,58 @@
+import asyncio
+from modules.admission import PriorityLimiter
+
+def test_priority_limiter():
+    async def scenario():
+        limiter = PriorityLimiter(1)
+        order = []
+
+        await limiter.acquire(priority=0, timeout=1)
+
+        async def worker(name, priority):
+            await limiter.acquire(priority, timeout=1)
+            order.append(name)
+            limiter.release()
+
+        # Queued in the order scan, webhook, but webhook has higher priority
+        scan = asyncio.create_task(worker("scan", 10))
+        await asyncio.sleep(0)
+        webhook = asyncio.create_task(worker("webhook", 0))
+        await asyncio.sleep(0)
+        assert limiter.waiting == 2
+
+        limiter.release()
+        await asyncio.gather(scan, webhook)
+        return order, limiter
+
+    order, limiter = asyncio.run(scenario())
+    print(f"Admission order: {order}")
+
+    assert order == ["webhook", "scan"]
+    assert limiter.active == 0
+    assert limiter.waiting == 0
+
+    print("Test Passed!")
+
+def test_priority_limiter_timeout():
+    async def scenario():
+        limiter = PriorityLimiter(1)
+        await limiter.acquire(priority=0, timeout=1)
+        try:
+            await limiter.acquire(priority=0, timeout=0.01)
+            timed_out = False
+        except asyncio.TimeoutError:
+            timed_out = True
+        limiter.release()
+        return timed_out, limiter
+
+    timed_out, limiter = asyncio.run(scenario())
+
+    assert timed_out
+    assert limiter.waiting == 0
+    assert limiter.active == 0
+
+    print("Test Passed!")
+
+if __name__ == "__main__":
+    test_priority_limiter()
+    test_priority_limiter_timeout()
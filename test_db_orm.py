@@ -6,7 +6,7 @@ def test_db():
     calc = Calculator("sqlite:///data/test_db.sqlite")
     
     print("Adding a bet...")
-    calc.add_bet("20231224", "中山", 11, "単勝", "1", 1000)
+    calc.add_bet("20231224", "中山", 11, "単勝", "1", 1000, user_id="test-user")
     
     print("Checking summary...")
     summary = calc.get_monthly_summary(2023, 12)
@@ -0,0 +1,78 @@
+import csv
+import io
+import os
+import tempfile
+from datetime import date
+import pyarrow as pa
+import pyarrow.parquet as pq
+from modules.calculator import Calculator
+from modules.exporter import Exporter
+
+def make_calculator():
+    db_path = os.path.join(tempfile.mkdtemp(), "export.sqlite")
+    calc = Calculator(f"sqlite:///{db_path}")
+
+    # Inserted out of date order, two bets on the same day
+    calc.add_bet("20231224", "中山", 11, "単勝", "1", 1000, user_id="a")
+    calc.add_bet("20231203", "中山", 1, "複勝", "2", 200, user_id="a")
+    calc.add_bet("20231224", "中山", 12, "馬連", "1-2", 300, user_id="b")
+    calc.add_bet("20231210", "中京", 5, "単勝", "7", 400, user_id="a")
+    calc.add_bet("20231228", "中山", 11, "3連単", "1-2-3", 500, user_id="b")
+    return calc
+
+def test_csv_empty_range():
+    calc = make_calculator()
+    exporter = Exporter(calc)
+
+    data = b"".join(exporter.iter_csv(date(2020, 1, 1), date(2020, 12, 31)))
+    rows = list(csv.reader(io.StringIO(data.decode("utf-8"))))
+    print(f"Empty export: {rows}")
+
+    assert rows == [Calculator.EXPORT_COLUMNS]
+
+    print("Test Passed!")
+
+def test_csv_multi_chunk():
+    calc = make_calculator()
+    # 5 rows in chunks of 2
+    exporter = Exporter(calc, chunk_size=2)
+
+    chunks = list(exporter.iter_csv(date(2023, 12, 1), date(2023, 12, 31)))
+    rows = list(csv.reader(io.StringIO(b"".join(chunks).decode("utf-8"))))
+    print(f"{len(chunks)} chunks, {len(rows) - 1} rows")
+
+    assert len(chunks) == 3
+    assert rows[0] == Calculator.EXPORT_COLUMNS
+
+    body = rows[1:]
+    keys = [(r[2], int(r[0])) for r in body] # (date, id)
+    assert len(body) == 5
+    assert keys == sorted(keys)
+    assert [r[2] for r in body] == ["2023-12-03", "2023-12-10", "2023-12-24", "2023-12-24", "2023-12-28"]
+
+    # User filter
+    user_rows = b"".join(exporter.iter_csv(date(2023, 12, 1), date(2023, 12, 31), user_id="b"))
+    assert len(user_rows.decode("utf-8").strip().splitlines()) == 1 + 2
+
+    print("Test Passed!")
+
+def test_parquet():
+    calc = make_calculator()
+    exporter = Exporter(calc, chunk_size=2)
+
+    data = b"".join(exporter.iter_parquet(date(2023, 12, 1), date(2023, 12, 31)))
+    table = pq.read_table(pa.BufferReader(data))
+    print(table.schema)
+
+    assert table.schema.names == Calculator.EXPORT_COLUMNS
+    assert table.schema.field("date").type == pa.date32()
+    assert table.schema.field("amount").type == pa.int64()
+    assert table.num_rows == 5
+    assert table.column("amount").to_pylist() == [200, 400, 1000, 300, 500]
+
+    print("Test Passed!")
+
+if __name__ == "__main__":
+    test_csv_empty_range()
+    test_csv_multi_chunk()
+    test_parquet()
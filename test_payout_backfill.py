@@ -0,0 +1,69 @@
+import os
+import tempfile
+from sqlalchemy import select, func
+from modules.calculator import Calculator
+from modules.payouts import PayoutStore, PayoutBackfill, RacePayout, PayoutImport
+
+PAGE = """
+<html><body>
+<table class="pay_table_01">
+  <tr><th class="tan">単勝</th><td>{win}</td><td class="txt_r">250</td><td>1</td></tr>
+  <tr><th class="fuku">複勝</th><td>3<br />5<br />8</td><td class="txt_r">110<br />140<br />1,230</td><td>1<br />2<br />9</td></tr>
+</table>
+</body></html>
+"""
+
+def write_page(directory, race_id, html):
+    with open(os.path.join(directory, f"{race_id}.html"), "w", encoding="utf-8") as f:
+        f.write(html)
+
+def count_rows(store, model):
+    session = store.Session()
+    try:
+        return session.execute(select(func.count()).select_from(model)).scalar()
+    finally:
+        session.close()
+
+def test_import_directory():
+    tmpdir = tempfile.mkdtemp()
+    archive = os.path.join(tmpdir, "archive")
+    os.makedirs(archive)
+
+    write_page(archive, "202305050811", PAGE.format(win=3))
+    write_page(archive, "202305050812", PAGE.format(win=7))
+    # Saved before the race was settled: no payout table
+    write_page(archive, "202305050801", "<html><body>発走前</body></html>")
+    # Unreadable page
+    os.symlink(os.path.join(tmpdir, "missing.html"), os.path.join(archive, "202305050802.html"))
+
+    store = PayoutStore(Calculator(f"sqlite:///{tmpdir}/payouts.sqlite"))
+    backfill = PayoutBackfill(store, workers=1, batch_size=1)
+
+    imported = backfill.import_directory(archive)
+    print(f"First run: {imported} races")
+    assert imported == 2
+    assert store.imported_race_ids() == {"202305050811", "202305050812"}
+    # 1 単勝 + 3 複勝 per race
+    assert count_rows(store, RacePayout) == 8
+
+    results = store.get_payouts("202305050812")
+    assert [r.bet_type for r in results] == ["単勝", "複勝"]
+    assert results[0].combinations == ["7"]
+    assert results[1].payouts == [110, 140, 1230]
+
+    # Checkpointed races are skipped; the empty and unreadable pages are retried
+    assert backfill.import_directory(archive) == 0
+    assert count_rows(store, RacePayout) == 8
+    assert count_rows(store, PayoutImport) == 2
+
+    # Forced re-import replaces rows instead of duplicating them
+    write_page(archive, "202305050811", PAGE.format(win=9))
+    assert backfill.import_directory(archive, force=True) == 2
+    assert count_rows(store, RacePayout) == 8
+    assert count_rows(store, PayoutImport) == 2
+    assert store.get_payouts("202305050811")[0].combinations == ["9"]
+
+    print("Test Passed!")
+
+if __name__ == "__main__":
+    test_import_directory()
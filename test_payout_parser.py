@@ -0,0 +1,34 @@
+from modules.jra_scraper import parse_payout_html
+from modules.payouts import race_id_from_path
+
+def test_payout_parser():
+    # Trimmed-down netkeiba race page: only the payout table matters
+    html = """
+    <html><body>
+    <table class="race_table_01"><tr><td>1</td><td>ignored</td></tr></table>
+    <table class="pay_table_01">
+      <tr><th class="tan">単勝</th><td>3</td><td class="txt_r">250</td><td>1</td></tr>
+      <tr><th class="fuku">複勝</th><td>3<br />5<br />8</td><td class="txt_r">110<br />140<br />1,230</td><td>1<br />2<br />9</td></tr>
+      <tr><th class="uren">馬連</th><td>3 - 5</td><td class="txt_r">480</td><td>1</td></tr>
+    </table>
+    </body></html>
+    """
+
+    results = parse_payout_html(html)
+    for r in results:
+        print(r)
+
+    assert [r.bet_type for r in results] == ["単勝", "複勝", "馬連"]
+    assert results[0].combinations == ["3"]
+    assert results[0].payouts == [250]
+    assert results[1].combinations == ["3", "5", "8"]
+    assert results[1].payouts == [110, 140, 1230]
+    assert results[2].combinations == ["3 - 5"]
+
+    assert race_id_from_path("archive/2023/202305050811.html") == "202305050811"
+    assert race_id_from_path("index.html") is None
+
+    print("Test Passed!")
+
+if __name__ == "__main__":
+    test_payout_parser()
@@ -0,0 +1,70 @@
+import base64
+import os
+import tempfile
+from datetime import date
+import numpy as np
+from modules.calculator import Calculator
+from modules.series import EPOCH, lttb, downsample_indices, cumulative_balance_series, encode_typed_array
+
+def test_lttb():
+    # A long noisy random walk with one deep drawdown
+    rng = np.random.default_rng(0)
+    y = np.cumsum(rng.normal(0, 100, 5000))
+    y[3210] = y.min() - 10000
+    x = np.arange(len(y), dtype=np.float64)
+
+    idx = lttb(x, y, 300)
+    print(f"LTTB kept {len(idx)} of {len(y)} points")
+
+    assert len(idx) == 300
+    assert idx[0] == 0
+    assert idx[-1] == len(y) - 1
+    assert np.all(np.diff(idx) > 0)
+
+    # Budget respected, and the global extremes survive
+    idx = downsample_indices(x, y, 300)
+    assert len(idx) <= 300
+    assert 3210 in idx
+    assert int(np.argmax(y)) in idx
+
+    # Nothing to do when already under budget
+    assert len(downsample_indices(x[:50], y[:50], 300)) == 50
+
+    print("Test Passed!")
+
+def test_cumulative_balance_series():
+    db_path = os.path.join(tempfile.mkdtemp(), "series.sqlite")
+    calc = Calculator(f"sqlite:///{db_path}")
+
+    calc.add_bet("20231203", "中山", 1, "単勝", "1", 1000, user_id="a")
+    calc.add_bet("20231203", "中山", 2, "単勝", "2", 500, user_id="a")
+    calc.add_bet("20231210", "中京", 5, "複勝", "7", 200, user_id="a")
+    calc.add_bet("20240106", "中山", 11, "馬連", "1-2", 300, user_id="a")
+    calc.add_bet("20231210", "中山", 11, "単勝", "3", 9999, user_id="b")
+    calc.update_result(2, 2500)
+    calc.update_result(4, 0)
+
+    days, cumulative, total = cumulative_balance_series(calc, date(2023, 12, 1), date(2024, 1, 31), 500, user_id="a")
+    print(f"days={days} cumulative={cumulative} total={total}")
+
+    assert total == 3
+    assert days.dtype == np.int32
+    assert cumulative.dtype == np.float64
+    expected_days = [date(2023, 12, 3), date(2023, 12, 10), date(2024, 1, 6)]
+    assert days.tolist() == [(d - EPOCH).days for d in expected_days]
+    # -1500 + 2500, then -200, then -300
+    assert cumulative.tolist() == [1000.0, 800.0, 500.0]
+
+    # Base64 payloads decode back to the same little-endian arrays
+    encoded_days = encode_typed_array(days, "int32")
+    encoded_values = encode_typed_array(cumulative, "float64")
+    assert encoded_days["dtype"] == "int32"
+    assert encoded_values["dtype"] == "float64"
+    assert np.array_equal(np.frombuffer(base64.b64decode(encoded_days["data"]), dtype="<i4"), days)
+    assert np.array_equal(np.frombuffer(base64.b64decode(encoded_values["data"]), dtype="<f8"), cumulative)
+
+    print("Test Passed!")
+
+if __name__ == "__main__":
+    test_lttb()
+    test_cumulative_balance_series()
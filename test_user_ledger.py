@@ -0,0 +1,95 @@
+import os
+import sqlite3
+import tempfile
+from sqlalchemy import inspect
+from modules.calculator import Calculator
+
+def test_per_user_summary():
+    db_path = os.path.join(tempfile.mkdtemp(), "users.sqlite")
+    calc = Calculator(f"sqlite:///{db_path}")
+
+    calc.add_bet("20231224", "中山", 11, "単勝", "1", 1000, user_id="a")
+    calc.add_bet("20231224", "中山", 11, "単勝", "2", 500, user_id="b")
+    calc.add_bet("20231228", "中山", 11, "単勝", "3", 300, user_id="b")
+
+    summary_a = calc.get_monthly_summary(2023, 12, user_id="a")
+    summary_b = calc.get_monthly_summary(2023, 12, user_id="b")
+    print(f"a: {summary_a}")
+    print(f"b: {summary_b}")
+
+    assert summary_a["total_bet"] == 1000
+    assert [d["date"] for d in summary_a["details"]] == ["2023-12-24"]
+    assert summary_b["total_bet"] == 800
+    assert [d["date"] for d in summary_b["details"]] == ["2023-12-24", "2023-12-28"]
+
+    # No user: the whole ledger
+    assert calc.get_monthly_summary(2023, 12)["total_bet"] == 1800
+
+    print("Test Passed!")
+
+def test_migrate_user_column():
+    # Schema from before bets had an owner
+    db_path = os.path.join(tempfile.mkdtemp(), "old.sqlite")
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE bets (
+            id INTEGER NOT NULL, date DATE, place VARCHAR, race_num INTEGER,
+            bet_type VARCHAR, buy_details VARCHAR, amount INTEGER, payout INTEGER,
+            result VARCHAR, PRIMARY KEY (id)
+        )
+    """)
+    conn.execute("INSERT INTO bets VALUES (1, '2023-12-24', '中山', 11, '単勝', '1', 1000, 0, '未')")
+    conn.commit()
+    conn.close()
+
+    calc = Calculator(f"sqlite:///{db_path}")
+
+    insp = inspect(calc.engine)
+    columns = [c["name"] for c in insp.get_columns("bets")]
+    indexes = [i["name"] for i in insp.get_indexes("bets")]
+    print(f"Columns: {columns}")
+    print(f"Indexes: {indexes}")
+
+    assert "user_id" in columns
+    assert "ix_bets_user_id_date" in indexes
+
+    # Old rows survive in the shared (user_id NULL) ledger
+    assert calc.get_monthly_summary(2023, 12)["total_bet"] == 1000
+    assert calc.get_monthly_summary(2023, 12, user_id="a")["total_bet"] == 0
+
+    # Running again is a no-op
+    Calculator(f"sqlite:///{db_path}")
+
+    # Hand the old shared ledger to its owner; later runs find nothing left to assign
+    assert calc.assign_legacy_bets("a") == 1
+    assert calc.get_monthly_summary(2023, 12, user_id="a")["total_bet"] == 1000
+    assert calc.assign_legacy_bets("b") == 0
+
+    print("Test Passed!")
+
+def test_migrate_missing_index():
+    # user_id already present (e.g. a table created from raw DDL) but no index yet
+    db_path = os.path.join(tempfile.mkdtemp(), "noindex.sqlite")
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE bets (
+            id INTEGER NOT NULL, user_id VARCHAR NOT NULL, date DATE, place VARCHAR,
+            race_num INTEGER, bet_type VARCHAR, buy_details VARCHAR, amount INTEGER,
+            payout INTEGER, result VARCHAR, PRIMARY KEY (id)
+        )
+    """)
+    conn.commit()
+    conn.close()
+
+    calc = Calculator(f"sqlite:///{db_path}")
+    indexes = [i["name"] for i in inspect(calc.engine).get_indexes("bets")]
+    print(f"Indexes: {indexes}")
+
+    assert "ix_bets_user_id_date" in indexes
+
+    print("Test Passed!")
+
+if __name__ == "__main__":
+    test_per_user_summary()
+    test_migrate_user_column()
+    test_migrate_missing_index()